@@ -1,7 +1,8 @@
 """Automatically create migrations."""
 from __future__ import annotations
 
-from collections.abc import Hashable
+from functools import lru_cache
+from types import MappingProxyType
 from typing import (
     TYPE_CHECKING,
     Any,
@@ -9,7 +10,9 @@ from typing import (
     Dict,
     Final,
     Iterable,
+    Iterator,
     List,
+    Mapping,
     Optional,
     Type,
     Union,
@@ -35,6 +38,8 @@ FIELD_MODULES_MAP: Final = {
     "TSVectorField": "pw_pext",
 }
 PW_MODULES: Final = "playhouse.postgres_ext", "playhouse.fields", "peewee"
+NO_INDEX: Final = (False, False)
+_MISSING: Final = object()
 
 
 def fk_to_params(field: pw.ForeignKeyField) -> TParams:
@@ -58,17 +63,34 @@ def dtf_to_params(field: pw.DateTimeField) -> TParams:
     return params
 
 
-FIELD_TO_PARAMS: Dict[Type[pw.Field], Callable[[Any], TParams]] = {
-    pw.CharField: lambda f: {"max_length": f.max_length},
-    pw.DecimalField: lambda f: {
-        "max_digits": f.max_digits,
-        "decimal_places": f.decimal_places,
-        "auto_round": f.auto_round,
-        "rounding": f.rounding,
-    },
-    pw.ForeignKeyField: fk_to_params,
-    pw.DateTimeField: dtf_to_params,
-}
+def char_to_params(field: pw.CharField) -> TParams:
+    """Get params from the given char field."""
+    return {"max_length": field.max_length}
+
+
+def decimal_to_params(field: pw.DecimalField) -> TParams:
+    """Get params from the given decimal field."""
+    return {
+        "max_digits": field.max_digits,
+        "decimal_places": field.decimal_places,
+        "auto_round": field.auto_round,
+        "rounding": field.rounding,
+    }
+
+
+def _empty_params(_field: pw.Field) -> TParams:
+    return {}
+
+
+# Read-only: adapters are memoized per field class in _params_adapter
+FIELD_TO_PARAMS: Final[Mapping[Type[pw.Field], Callable[[Any], TParams]]] = MappingProxyType(
+    {
+        pw.CharField: char_to_params,
+        pw.DecimalField: decimal_to_params,
+        pw.ForeignKeyField: fk_to_params,
+        pw.DateTimeField: dtf_to_params,
+    }
+)
 
 
 class Column(VanilaColumn):
@@ -91,11 +113,12 @@ class Column(VanilaColumn):
         if field.default is not None and not callable(field.default):
             self.default = repr(field.default)
 
-        if self.field_class in FIELD_TO_PARAMS:
+        adapter = _params_adapter(type(field))  # type: ignore[arg-type]
+        if adapter is not _empty_params:
             if self.extra_parameters is None:  # type: ignore[has-type]
                 self.extra_parameters = {}
 
-            self.extra_parameters.update(FIELD_TO_PARAMS[self.field_class](field))
+            self.extra_parameters.update(adapter(field))
 
         self.rel_model = None
         self.to_field = None
@@ -105,7 +128,7 @@ class Column(VanilaColumn):
             self.rel_model = (
                 "'self'"
                 if field.rel_model == field.model
-                else "migrator.orm['%s']" % field.rel_model._meta.table_name
+                else f"migrator.orm['{field.rel_model._meta.table_name}']"
             )
 
     def get_field(self, space: str = " ") -> str:
@@ -113,9 +136,7 @@ class Column(VanilaColumn):
         field = super(Column, self).get_field()
         module = FIELD_MODULES_MAP.get(self.field_class.__name__, "pw")
         name, _, field = [s and s.strip() for s in field.partition("=")]
-        return "{name}{space}={space}{module}.{field}".format(
-            name=name, field=field, space=space, module=module
-        )
+        return f"{name}{space}={space}{module}.{field}"
 
     def get_field_parameters(self) -> TParams:
         """Generate parameters for self field."""
@@ -125,22 +146,33 @@ class Column(VanilaColumn):
         return params
 
 
-def diff_one(model1: TModelType, model2: TModelType, **kwargs) -> List[str]:  # noqa:
+def diff_one(  # noqa:
+    model1: TModelType,
+    model2: TModelType,
+    *,
+    meta1: Optional[pw.Metadata] = None,
+    meta2: Optional[pw.Metadata] = None,
+    **kwargs,
+) -> List[str]:
     """Find difference between given peewee models."""
     changes = []
 
-    meta1, meta2 = model1._meta, model2._meta  # type: ignore[]
+    if meta1 is None:
+        meta1 = model1._meta  # type: ignore[]
+    if meta2 is None:
+        meta2 = model2._meta  # type: ignore[]
     field_names1 = meta1.fields
     field_names2 = meta2.fields
+    keys1, keys2 = field_names1.keys(), field_names2.keys()
 
     # Add fields
-    names1 = set(field_names1) - set(field_names2)
+    names1 = keys1 - keys2
     if names1:
         fields = [field_names1[name] for name in names1]
         changes.append(create_fields(model1, *fields, **kwargs))
 
     # Drop fields
-    names2 = set(field_names2) - set(field_names1)
+    names2 = keys2 - keys1
     if names2:
         changes.append(drop_fields(model1, *names2))
 
@@ -148,7 +180,7 @@ def diff_one(model1: TModelType, model2: TModelType, **kwargs) -> List[str]:  #
     fields_ = []
     nulls_ = []
     indexes_ = []
-    for name in set(field_names1) - names1 - names2:
+    for name in keys1 & keys2:
         field1, field2 = field_names1[name], field_names2[name]
         diff = compare_fields(field1, field2)
         null = diff.pop("null", None)
@@ -178,18 +210,16 @@ def diff_one(model1: TModelType, model2: TModelType, **kwargs) -> List[str]:  #
             changes.append(drop_index(model1, name))
 
     # Check additional compound indexes
-    indexes1 = meta1.indexes
-    indexes2 = meta2.indexes
+    indexes1 = set(meta1.indexes)
+    indexes2 = set(meta2.indexes)
 
     # Drop compound indexes
-    indexes_to_drop = set(indexes2) - set(indexes1)
-    for index in indexes_to_drop:
+    for index in indexes2 - indexes1:
         if isinstance(index[0], (list, tuple)) and len(index[0]) > 1:
             changes.append(drop_index(model1, name=index[0]))
 
     # Add compound indexes
-    indexes_to_add = set(indexes1) - set(indexes2)
-    for index in indexes_to_add:
+    for index in indexes1 - indexes2:
         if isinstance(index[0], (list, tuple)) and len(index[0]) > 1:
             changes.append(add_index(model1, name=index[0], unique=index[1]))
 
@@ -204,63 +234,64 @@ def diff_many(
     reverse=False,
 ) -> List[str]:
     """Calculate changes for migrations from models2 to models1."""
-    models1 = cast(List["TModelType"], pw.sort_models(models1))  # type: ignore[]
-    models2 = cast(List["TModelType"], pw.sort_models(models2))  # type: ignore[]
+    entries1 = [(m._meta.table_name, m._meta, m) for m in pw.sort_models(models1)]
+    entries2 = [(m._meta.table_name, m._meta, m) for m in pw.sort_models(models2)]
 
     if reverse:
-        models1 = list(reversed(models1))
-        models2 = list(reversed(models2))
+        entries1.reverse()
+        entries2.reverse()
 
-    models_map1 = {cast(str, m._meta.table_name): m for m in models1}  # type: ignore[]
-    models_map2 = {cast(str, m._meta.table_name): m for m in models2}  # type: ignore[]
+    models_map1 = {cast(str, name): (meta, m) for name, meta, m in entries1}
+    models_map2 = {cast(str, name): (meta, m) for name, meta, m in entries2}
 
     changes: List[str] = []
 
-    for name, model1 in models_map1.items():
+    for name, (meta1, model1) in models_map1.items():
         if name not in models_map2:
             continue
-        changes.extend(diff_one(model1, models_map2[name], migrator=migrator))
+        meta2, model2 = models_map2[name]
+        changes.extend(diff_one(model1, model2, meta1=meta1, meta2=meta2, migrator=migrator))
 
     # Add models
-    for name in [m for m in models_map1 if m not in models_map2]:
-        changes.append(create_model(models_map1[name], migrator=migrator))
+    for name, (_, model1) in models_map1.items():
+        if name not in models_map2:
+            changes.append(create_model(model1, migrator=migrator))
 
     # Remove models
-    for name in [m for m in models_map2 if m not in models_map1]:
-        changes.append(remove_model(models_map2[name]))
+    for name, (_, model2) in models_map2.items():
+        if name not in models_map1:
+            changes.append(remove_model(model2))
 
     return changes
 
 
 def model_to_code(model_cls: TModelType, **kwargs) -> str:
     """Generate migrations for the given model."""
-    template = "class {classname}(pw.Model):\n{fields}\n\n{meta}"
-    meta = model_cls._meta  # type: ignore[]
-    fields = INDENT + NEWLINE.join(
-        [
-            field_to_code(field, **kwargs)
-            for field in meta.sorted_fields
-            if not (isinstance(field, pw.PrimaryKeyField) and field.name == "id")
-        ]
-    )
-    meta = INDENT + NEWLINE.join(
-        filter(
-            None,
-            [
-                "class Meta:",
-                f'{INDENT}table_name = "{meta.table_name}"',
-                f'{INDENT}schema = "{meta.schema}"' if meta.schema else "",
-                (
-                    f"{INDENT}primary_key = pw.CompositeKey{meta.primary_key.field_names!r}"
-                    if isinstance(meta.primary_key, pw.CompositeKey)
-                    else ""
-                ),
-                f"{INDENT}indexes = {meta.indexes!r}" if meta.indexes else "",
-            ],
-        )
-    )
+    return "\n".join(_gen_lines(model_cls, **kwargs))
+
 
-    return template.format(classname=model_cls.__name__, fields=fields, meta=meta)
+def _gen_lines(model_cls: TModelType, **kwargs) -> Iterator[str]:
+    meta = model_cls._meta  # type: ignore[]
+    pk = meta.primary_key
+    skip = pk if isinstance(pk, pw.PrimaryKeyField) and pk.name == "id" else None
+    yield f"class {model_cls.__name__}(pw.Model):"
+    for field in meta.sorted_fields:
+        if field is not skip:
+            yield INDENT + field_to_code(field, **kwargs)
+    yield ""
+    yield INDENT + "class Meta:"
+    yield from _meta_lines(meta)
+
+
+def _meta_lines(meta: pw.Metadata) -> Iterator[str]:
+    indent = INDENT * 2
+    yield f'{indent}table_name = "{meta.table_name}"'
+    if meta.schema:
+        yield f'{indent}schema = "{meta.schema}"'
+    if isinstance(meta.primary_key, pw.CompositeKey):
+        yield f"{indent}primary_key = pw.CompositeKey{meta.primary_key.field_names!r}"
+    if meta.indexes:
+        yield f"{indent}indexes = {meta.indexes!r}"
 
 
 def create_model(model_cls: TModelType, **kwargs) -> str:
@@ -271,33 +302,26 @@ def create_model(model_cls: TModelType, **kwargs) -> str:
 def remove_model(model_cls: TModelType, **kwargs) -> str:
     """Generate migrations to remove model."""
     meta = model_cls._meta  # type: ignore[]
-    return "migrator.remove_model('%s')" % meta.table_name
+    return f"migrator.remove_model('{meta.table_name}')"
 
 
 def create_fields(model_cls: TModelType, *fields: pw.Field, **kwargs) -> str:
     """Generate migrations to add fields."""
     meta = model_cls._meta  # type: ignore[]
-    return "migrator.add_fields(%s'%s', %s)" % (
-        NEWLINE,
-        meta.table_name,
-        NEWLINE
-        + ("," + NEWLINE).join([field_to_code(field, space=False, **kwargs) for field in fields]),
-    )
+    body = ("," + NEWLINE).join([field_to_code(field, space=False, **kwargs) for field in fields])
+    return f"migrator.add_fields({NEWLINE}'{meta.table_name}', {NEWLINE}{body})"
 
 
 def drop_fields(model_cls: TModelType, *fields: pw.Field, **kwargs) -> str:
     """Generate migrations to remove fields."""
     meta = model_cls._meta  # type: ignore[]
-    return "migrator.remove_fields('%s', %s)" % (
-        meta.table_name,
-        ", ".join(map(repr, fields)),
-    )
+    names = ", ".join(map(repr, fields))
+    return f"migrator.remove_fields('{meta.table_name}', {names})"
 
 
 def field_to_code(field: pw.Field, *, space: bool = True, **kwargs) -> str:
     """Generate field description."""
-    col = Column(field, **kwargs)
-    return col.get_field(" " if space else "")
+    return Column(field, **kwargs).get_field(" " if space else "")
 
 
 def compare_fields(field1: pw.Field, field2: pw.Field, **kwargs) -> Dict:
@@ -311,21 +335,28 @@ def compare_fields(field1: pw.Field, field2: pw.Field, **kwargs) -> Dict:
     params2 = field_to_params(field2)
     params2["null"] = field2.null
 
-    return dict(set(params1.items()) - set(params2.items()))
+    diff = {k: v for k, v in params1.items() if params2.get(k, _MISSING) != v}
+
+    # Fields without indexes have no "index" param
+    if "index" in params2 and "index" not in params1:
+        diff["index"] = NO_INDEX
+
+    return diff
 
 
 def field_to_params(field: pw.Field, **kwargs) -> TParams:
     """Generate params for the given field."""
-    ftype = find_field_type(field)
-    params = FIELD_TO_PARAMS.get(ftype, lambda f: {})(field)
-    if (
-        field.default is not None
-        and not callable(field.default)
-        and isinstance(field.default, Hashable)
-    ):
-        params["default"] = field.default
+    params = _params_adapter(type(field))(field)  # type: ignore[arg-type]
+    if field.default is not None and not callable(field.default):
+        try:
+            hash(field.default)
+        except TypeError:  # Ignore unhashable defaults
+            pass
+        else:
+            params["default"] = field.default
 
-    params["index"] = field.index and not field.unique, field.unique
+    if field.index or field.unique:
+        params["index"] = (field.index and not field.unique, field.unique)
 
     params.pop("backref", None)  # Ignore backref
     return params
@@ -334,38 +365,51 @@ def field_to_params(field: pw.Field, **kwargs) -> TParams:
 def change_fields(model_cls: TModelType, *fields: pw.Field, **kwargs) -> str:
     """Generate migrations to change fields."""
     meta = model_cls._meta  # type: ignore[]
-    return "migrator.change_fields('%s', %s)" % (
-        meta.table_name,
-        ("," + NEWLINE).join([field_to_code(f, space=False) for f in fields]),
-    )
+    body = ("," + NEWLINE).join([field_to_code(f, space=False) for f in fields])
+    return f"migrator.change_fields('{meta.table_name}', {body})"
 
 
 def change_not_null(model_cls: TModelType, name: str, *, null: bool) -> str:
     """Generate migrations."""
     meta = model_cls._meta  # type: ignore[]
     operation = "drop_not_null" if null else "add_not_null"
-    return "migrator.%s('%s', %s)" % (operation, meta.table_name, repr(name))
+    return f"migrator.{operation}('{meta.table_name}', {name!r})"
 
 
 def add_index(model_cls: TModelType, name: Union[str, Iterable[str]], *, unique: bool) -> str:
     """Generate migrations."""
     meta = model_cls._meta  # type: ignore[]
-    columns = repr(name).strip("()[]")
+    columns = _fmt_cols(name)
     return f"migrator.add_index('{meta.table_name}', {columns}, unique={unique})"
 
 
 def drop_index(model_cls: TModelType, name: Union[str, Iterable[str]]) -> str:
     """Generate migrations."""
     meta = model_cls._meta  # type: ignore[]
-    columns = repr(name).strip("()[]")
+    columns = _fmt_cols(name)
     return f"migrator.drop_index('{meta.table_name}', {columns})"
 
 
+def _fmt_cols(name: Union[str, Iterable[str]]) -> str:
+    if isinstance(name, str):
+        return repr(name)
+    return ", ".join(map(repr, name))
+
+
 def find_field_type(field: pw.Field) -> Type[pw.Field]:
-    ftype = type(field)
+    return _type_of_field(type(field))  # type: ignore[arg-type]
+
+
+@lru_cache(maxsize=None)
+def _type_of_field(ftype: Type[pw.Field]) -> Type[pw.Field]:
     if ftype.__module__ not in PW_MODULES:
         for cls in ftype.mro():
             if cls.__module__ in PW_MODULES:
                 return cls
 
     return ftype
+
+
+@lru_cache(maxsize=None)
+def _params_adapter(ftype: Type[pw.Field]) -> Callable[[Any], TParams]:
+    return FIELD_TO_PARAMS.get(_type_of_field(ftype), _empty_params)  # type: ignore[arg-type]
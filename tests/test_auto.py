@@ -4,6 +4,7 @@ import datetime as dt
 from pathlib import Path
 
 import peewee as pw
+import pytest
 from playhouse.postgres_ext import (
     ArrayField,
     BinaryJSONField,
@@ -219,3 +220,63 @@ def test_custom_fields():
 
     res = compare_fields(Test2.dtfield, Test.dtfield)
     assert not res
+
+
+def test_index_columns():
+    from peewee_migrate.auto import add_index, drop_index
+
+    class Object(pw.Model):
+        first_name = pw.CharField()
+        last_name = pw.CharField()
+
+    assert drop_index(Object, "first_name") == "migrator.drop_index('object', 'first_name')"
+    assert (
+        add_index(Object, ("first_name",), unique=True)
+        == "migrator.add_index('object', 'first_name', unique=True)"
+    )
+    assert (
+        add_index(Object, ["first_name", "last_name"], unique=False)
+        == "migrator.add_index('object', 'first_name', 'last_name', unique=False)"
+    )
+
+
+def test_model_to_code_reflects_meta_changes():
+    from peewee_migrate.auto import diff_many
+
+    class Object(pw.Model):
+        name = pw.CharField()
+
+    (code,) = diff_many([Object], [])
+    assert "age" not in code
+
+    Object._meta.add_field("age", pw.IntegerField())
+    (code,) = diff_many([Object], [])
+    assert "age = pw.IntegerField()" in code
+
+
+def test_field_to_params_adapters_read_only():
+    from peewee_migrate.auto import FIELD_TO_PARAMS
+
+    with pytest.raises(TypeError):
+        FIELD_TO_PARAMS[pw.TextField] = lambda f: {}  # type: ignore[index]
+
+
+def test_drop_field_index():
+    from peewee_migrate.auto import compare_fields, diff_one, field_to_params
+
+    class Object(pw.Model):
+        name = pw.CharField()
+
+    class ObjectIndexed(pw.Model):
+        name = pw.CharField(index=True)
+
+        class Meta:
+            table_name = "object"
+
+    assert field_to_params(Object.name) == {"max_length": 255}
+    assert field_to_params(ObjectIndexed.name) == {"max_length": 255, "index": (True, False)}
+
+    assert compare_fields(Object.name, ObjectIndexed.name) == {"index": (False, False)}
+
+    changes = diff_one(Object, ObjectIndexed)
+    assert changes == ["migrator.drop_index('object', 'name')"]